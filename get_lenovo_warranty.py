@@ -4,7 +4,7 @@ get_lenovo_warranty.py
 Get Lenovo warranty information via web scrape using serial number
 Usage:
   Single: python get_lenovo_warranty.py <serial_number>
-  Bulk:   python get_lenovo_warranty.py -f devices.txt [-o output.csv]
+  Bulk:   python get_lenovo_warranty.py -f devices.txt [-o output.csv] [--concurrency N]
   Bulk + summary by year:
           python get_lenovo_warranty.py -f devices.txt --summary-by-year [--summary-output summary.csv]
 
@@ -12,59 +12,276 @@ Haim Cohen 2025
 LinkedIn: https://www.linkedin.com/in/haimc/
 """
 
-import re
+import os
 import sys
+import json
+import time
+import hashlib
+import tempfile
 import argparse
 import csv
 import warnings
-from typing import Dict, Optional, List
-from datetime import datetime
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, Optional, List
+from datetime import date, datetime
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+# Suppress the urllib3 OpenSSL warning raised at import time only, without
+# leaving a process-wide filter installed
+with warnings.catch_warnings():
+    warnings.filterwarnings('ignore', message='urllib3 v2 only supports OpenSSL 1.1.1+')
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+# Default number of parallel lookups in bulk mode
+DEFAULT_CONCURRENCY = 10
+
+# Bulk table lines and CSV rows are written in batches of this many results
+OUTPUT_BATCH_SIZE = 100
+
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (5, 30)
+
+# Status pages are streamed in chunks; larger pages fail the lookup
+CHUNK_SIZE = 16384
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+# On-disk cache of status pages; end dates only change when a contract is renewed
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                         'lenovo_warranty')
+CACHE_TTL = 24 * 60 * 60
+
+# Marker preceding each warranty end date on the status page (matched case-insensitively)
+_END_DATE_MARKER = b'end date:&nbsp;</b>'
+
+# Retry transient failures on the pooled connection before reporting ERROR
+_RETRY_OPTIONS = dict(
+    total=3,
+    backoff_factor=0.4,
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=True,
+)
+try:
+    _RETRY = Retry(allowed_methods=frozenset(['GET']), **_RETRY_OPTIONS)
+except TypeError:
+    # urllib3 < 1.26
+    _RETRY = Retry(method_whitelist=frozenset(['GET']), **_RETRY_OPTIONS)
+
+# Minimum number of pooled connections kept alive to Lenovo
+DEFAULT_POOL_SIZE = 32
+
+# Shared session so TLS connections to Lenovo are kept alive and reused
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    'Connection': 'keep-alive',
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'),
+})
+
+def _mount_adapter(pool_size: int) -> None:
+    """(Re)mount the HTTPS adapter with room for pool_size concurrent connections."""
+    # Close the adapter being replaced so its pooled connections aren't leaked
+    _SESSION.get_adapter('https://').close()
+    _SESSION.mount('https://', HTTPAdapter(
+        pool_maxsize=max(pool_size, DEFAULT_POOL_SIZE),
+        max_retries=_RETRY
+    ))
+
+_mount_adapter(DEFAULT_POOL_SIZE)
+
+def _parse_iso(date_str: str) -> datetime:
+    """
+    Parse a YYYY-MM-DD date string.
+
+    Slices the fields directly for the common fixed-width, all-digit form and
+    only falls back to strptime for anything else. Raises ValueError like strptime.
+    """
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+        # int() also accepts signs and whitespace, so require plain ASCII digits
+        if not (date_str[0:4] + date_str[5:7] + date_str[8:10]).strip('0123456789'):
+            try:
+                return datetime(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]))
+            except ValueError:
+                pass
+    return datetime.strptime(date_str, '%Y-%m-%d')
+
+# Parsed dates by string (None = unparsable); fleets share few distinct end dates
+_DATE_CACHE: Dict[str, Optional[datetime]] = {}
+_MISS = object()
+
+def _parse_cached(date_str: str) -> Optional[datetime]:
+    """
+    Memoized _parse_iso. Returns None instead of raising for unparsable dates.
+    """
+    parsed = _DATE_CACHE.get(date_str, _MISS)
+    if parsed is _MISS:
+        try:
+            parsed = _parse_iso(date_str)
+        except ValueError:
+            parsed = None
+        _DATE_CACHE[date_str] = parsed
+    return parsed
+
+def _cache_paths(serial_number: str):
+    """Return the (page, metadata) cache file paths for a serial number."""
+    key = hashlib.sha1(serial_number.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key + '.html'), os.path.join(CACHE_DIR, key + '.json')
+
+def _read_cache(serial_number: str):
+    """
+    Look up a cached status page.
+
+    Returns:
+        Tuple of (page bytes or None, is_fresh, validator headers dict)
+    """
+    page_path, meta_path = _cache_paths(serial_number)
+    try:
+        with open(page_path, 'rb') as f:
+            page = f.read()
+        fresh = time.time() - os.path.getmtime(page_path) < CACHE_TTL
+    except OSError:
+        return None, False, {}
+
+    validators = {}
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('etag'):
+            validators['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            validators['If-Modified-Since'] = meta['last_modified']
+    except (OSError, ValueError):
+        pass
+    return page, fresh, validators
+
+def _replace_file(path: str, data: bytes) -> None:
+    """Atomically replace path with data via a uniquely named temp file."""
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _write_cache(serial_number: str, page: bytes, headers) -> None:
+    """Store a status page and its ETag/Last-Modified validators (best effort)."""
+    page_path, meta_path = _cache_paths(serial_number)
+    meta = {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Page first: validators must never describe a page that wasn't written
+        _replace_file(page_path, page)
+        _replace_file(meta_path, json.dumps(meta).encode('utf-8'))
+    except OSError:
+        pass
+
+def _fetch_status_page(serial_number: str, use_cache: bool = True) -> bytes:
+    """
+    Download the raw warranty status page for a serial number.
 
-# Suppress urllib3 OpenSSL warnings
-warnings.filterwarnings('ignore', message='urllib3 v2 only supports OpenSSL 1.1.1+')
+    The body is streamed and a page larger than MAX_PAGE_BYTES fails the
+    lookup rather than being parsed partially, which bounds memory per
+    worker. With use_cache, pages younger than CACHE_TTL are served from
+    disk and stale ones are revalidated with If-None-Match / If-Modified-Since.
+    Raises RequestException.
+    """
+    cached, fresh, validators = _read_cache(serial_number) if use_cache else (None, False, {})
+    if cached is not None and fresh:
+        return cached
+
+    url = f"https://csp.lenovo.com/ibapp/il/WarrantyStatus.jsp?serial={serial_number}"
 
-import requests
+    with _SESSION.get(url, timeout=REQUEST_TIMEOUT, stream=True, headers=validators) as response:
+        if response.status_code == 304 and cached is not None:
+            # Unchanged on the server; refresh the cache timestamp
+            try:
+                os.utime(_cache_paths(serial_number)[0])
+            except OSError:
+                pass
+            return cached
 
-def get_lenovo_warranty(serial_number: str) -> Dict[str, str]:
+        response.raise_for_status()
+        page = bytearray()
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            page += chunk
+            if len(page) > MAX_PAGE_BYTES:
+                # A cut-off page could hide the latest End Date; report it instead
+                raise requests.exceptions.RequestException(
+                    f"status page exceeds {MAX_PAGE_BYTES} bytes")
+        headers = response.headers
+
+    page = bytes(page)
+    if use_cache:
+        _write_cache(serial_number, page, headers)
+    return page
+
+def _extract_end_dates(page: bytes) -> List[str]:
+    """
+    Return the raw text following every End Date marker in a status page.
+
+    Equivalent to findall(r'End Date:&nbsp;</b>([^<]+)', re.IGNORECASE), but
+    locates markers with bytes.find() on a lowercased copy of the undecoded
+    page instead of regex matching, which is several times faster on large pages.
+    """
+    lowered = page.lower()
+    end_dates = []
+    pos = 0
+    while True:
+        idx = lowered.find(_END_DATE_MARKER, pos)
+        if idx < 0:
+            return end_dates
+        start = idx + len(_END_DATE_MARKER)
+        end = page.find(b'<', start)
+        if end < 0:
+            end = len(page)
+        if end > start:
+            end_dates.append(page[start:end].decode('ascii', 'ignore'))
+        # Resume after the captured value, where findall() would
+        pos = end
+
+def get_lenovo_warranty(serial_number: str, use_cache: bool = True) -> Dict[str, str]:
     """
     Fetch and parse Lenovo warranty information for a given serial number.
     Returns the LATEST warranty end date.
 
     Args:
         serial_number: The device serial number
+        use_cache: If True, reuse/store the status page in the on-disk cache
 
     Returns:
         Dictionary with serial number and latest warranty end date
     """
-    url = f"https://csp.lenovo.com/ibapp/il/WarrantyStatus.jsp?serial={serial_number}"
-
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        html_content = response.text
+        html_content = _fetch_status_page(serial_number, use_cache)
 
         # Extract all warranty end dates
-        end_dates = re.findall(r'End Date:&nbsp;</b>([^<]+)', html_content, re.IGNORECASE)
+        end_dates = _extract_end_dates(html_content)
 
-        # Clean and parse dates
-        valid_dates = []
+        # Clean and parse dates, tracking the latest one as we go
+        best_date = None
+        best_str = None
+        unparsed_str = None
         for date_str in end_dates:
             date_str = date_str.strip()
-            if date_str and date_str != 'N/A':
-                try:
-                    parsed_date = datetime.strptime(date_str, '%Y-%m-%d')
-                    valid_dates.append((parsed_date, date_str))
-                except ValueError:
-                    # Keep string for completeness, but won't be sortable by date
-                    valid_dates.append((None, date_str))
-
-        # Find the latest date
-        if valid_dates:
-            valid_dates.sort(key=lambda x: x[0] if x[0] else datetime.min)
-            latest_date = valid_dates[-1][1]
-        else:
-            latest_date = 'N/A'
+            if not date_str or date_str == 'N/A':
+                continue
+            parsed_date = _parse_cached(date_str)
+            if parsed_date is None:
+                # Kept for completeness in case nothing parses, but not comparable
+                unparsed_str = date_str
+            elif best_date is None or parsed_date > best_date:
+                best_date, best_str = parsed_date, date_str
+
+        latest_date = best_str or unparsed_str or 'N/A'
 
         return {
             'SerialNumber': serial_number,
@@ -78,41 +295,46 @@ def get_lenovo_warranty(serial_number: str) -> Dict[str, str]:
             'WarrantyTill': 'ERROR'
         }
 
-def summarize_by_year(results: List[Dict[str, str]], summary_csv: Optional[str] = None):
+def _tally_by_year(end_date_counts: Counter) -> Dict[str, Dict[str, int]]:
     """
-    Build a summary table by EndDate year: Total / Active / Expired.
+    Bucket end dates by year into Total / Active / Expired counts.
 
     Args:
-        results: list of dicts with keys ['SerialNumber', 'WarrantyTill']
-        summary_csv: optional path to write CSV (Year,Total,Active,Expired)
+        end_date_counts: Counter of WarrantyTill strings
+
+    Returns:
+        Dictionary of year -> {'Total', 'Active', 'Expired'}
     """
-    today = datetime.now()
+    # Compare calendar days as ordinals; a warranty ending today still counts as active
+    today_ord = date.today().toordinal()
     year_counts = defaultdict(lambda: {"Total": 0, "Active": 0, "Expired": 0})
 
-    for row in results:
-        end_str = row.get('WarrantyTill', '')
+    # Each distinct end date is classified once; fleets share only a few dates
+    for end_str, count in end_date_counts.items():
         if not end_str or end_str in ('N/A', 'ERROR'):
             continue
-        try:
-            end_dt = datetime.strptime(end_str, '%Y-%m-%d')
-        except ValueError:
+        end_dt = _parse_cached(end_str)
+        if end_dt is None:
             # Unparsable date — skip from year stats
             continue
 
         year = str(end_dt.year)
-        year_counts[year]["Total"] += 1
-        if end_dt >= today:
-            year_counts[year]["Active"] += 1
+        year_counts[year]["Total"] += count
+        if end_dt.toordinal() >= today_ord:
+            year_counts[year]["Active"] += count
         else:
-            year_counts[year]["Expired"] += 1
+            year_counts[year]["Expired"] += count
 
-    # Print table
-    print("\nSummary by Year")
-    print("-" * 48)
-    print(f"{'Year':<6} {'Total':<8} {'Active':<8} {'Expired':<8}")
+    return year_counts
+
+def _report_year_summary(year_counts: Dict[str, Dict[str, int]], summary_csv: Optional[str] = None):
+    """Print the yearly summary table and optionally export it as CSV."""
+    # Print table in a single write
+    lines = ["\nSummary by Year", "-" * 48, f"{'Year':<6} {'Total':<8} {'Active':<8} {'Expired':<8}"]
     for y in sorted(year_counts.keys()):
         data = year_counts[y]
-        print(f"{y:<6} {data['Total']:<8} {data['Active']:<8} {data['Expired']:<8}")
+        lines.append(f"{y:<6} {data['Total']:<8} {data['Active']:<8} {data['Expired']:<8}")
+    sys.stdout.write("\n".join(lines) + "\n")
 
     # Optional CSV export
     if summary_csv:
@@ -124,68 +346,135 @@ def summarize_by_year(results: List[Dict[str, str]], summary_csv: Optional[str]
                 writer.writerow([y, d["Total"], d["Active"], d["Expired"]])
         print(f"\nSaved summary CSV → {summary_csv}")
 
+def summarize_by_year(results: List[Dict[str, str]], summary_csv: Optional[str] = None):
+    """
+    Build a summary table by EndDate year: Total / Active / Expired.
+
+    Args:
+        results: list of dicts with keys ['SerialNumber', 'WarrantyTill']
+        summary_csv: optional path to write CSV (Year,Total,Active,Expired)
+    """
+    end_date_counts = Counter(row.get('WarrantyTill', '') for row in results)
+    _report_year_summary(_tally_by_year(end_date_counts), summary_csv)
+
+def _read_serials(lines: Iterable[str]) -> Iterator[str]:
+    """Yield serial numbers from an open file, skipping empty lines and comments."""
+    for line in lines:
+        serial = line.strip()
+
+        # Skip empty lines and comments
+        if not serial or serial.startswith('#'):
+            continue
+
+        yield serial
+
+def _ordered_parallel_map(func: Callable, items: Iterable, max_workers: int) -> Iterator:
+    """
+    Like executor.map(), but keeps at most a small window of calls in flight.
+
+    Results are yielded in input order as soon as they are ready, while the
+    input is consumed lazily. Repeated items reuse the first call's result,
+    so each distinct item is only looked up once.
+    """
+    window = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Futures are only kept while in flight; resolved items keep just their result
+        in_flight = {}
+        results = {}
+        pending = deque()
+
+        def resolve():
+            item, future = pending.popleft()
+            if future is None:
+                return results[item]
+            result = results[item] = future.result()
+            in_flight.pop(item, None)
+            return result
+
+        for item in items:
+            if item in results:
+                pending.append((item, None))
+            else:
+                future = in_flight.get(item)
+                if future is None:
+                    future = in_flight[item] = executor.submit(func, item)
+                pending.append((item, future))
+            if len(pending) >= window:
+                yield resolve()
+        while pending:
+            yield resolve()
+
+def _flush_batch(lines: List[str], rows: List[tuple], writer) -> None:
+    """Emit a batch of table lines and CSV rows."""
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+    if writer is not None and rows:
+        writer.writerows(rows)
+
 def process_bulk_lookup(input_file: str, output_file: Optional[str] = None,
-                        do_summary_by_year: bool = False, summary_output: Optional[str] = None):
+                        do_summary_by_year: bool = False, summary_output: Optional[str] = None,
+                        concurrency: int = DEFAULT_CONCURRENCY, use_cache: bool = True):
     """
     Process multiple serial numbers from a file.
 
+    Rows are printed and written to the CSV as lookups complete; only a
+    per-end-date counter is kept in memory for the summaries.
+
     Args:
         input_file: Path to file containing serial numbers (one per line)
         output_file: Optional output CSV file path
         do_summary_by_year: If True, print summary by year
         summary_output: Optional CSV file for the summary
+        concurrency: Maximum number of lookups running in parallel
+        use_cache: If True, use the on-disk status page cache
     """
-    all_results = []
-    active_count = 0
-    expired_count = 0
-    today = datetime.now()
-
-    with open(input_file, 'r') as f:
-        for line in f:
-            serial = line.strip()
-
-            # Skip empty lines and comments
-            if not serial or serial.startswith('#'):
-                continue
-
-            warranty_info = get_lenovo_warranty(serial)
-            all_results.append(warranty_info)
-
-            # Count active vs expired (global)
-            warranty_date = warranty_info['WarrantyTill']
-            if warranty_date not in ('N/A', 'ERROR'):
-                try:
-                    warranty_end = datetime.strptime(warranty_date, '%Y-%m-%d')
-                    if warranty_end >= today:
-                        active_count += 1
-                    else:
-                        expired_count += 1
-                except ValueError:
-                    pass
-
-    # Display as table
-    print(f"\n{'SerialNumber':<15} {'WarrantyTill':<15}")
-    print("-" * 32)
-    for result in all_results:
-        print(f"{result['SerialNumber']:<15} {result['WarrantyTill']:<15}")
+    concurrency = max(1, concurrency)
+
+    end_date_counts = Counter()
+    fetch = partial(get_lenovo_warranty, use_cache=use_cache)
+
+    # Display as table, streaming rows (and CSV lines) as they arrive
+    lines = [f"\n{'SerialNumber':<15} {'WarrantyTill':<15}", "-" * 32]
+    # Open the input first so a bad -f path can't truncate an existing -o file
+    with ExitStack() as stack:
+        input_f = stack.enter_context(open(input_file, 'r'))
+        writer = None
+        if output_file:
+            f = stack.enter_context(open(output_file, 'w', newline=''))
+            writer = csv.writer(f)
+            writer.writerow(['SerialNumber', 'WarrantyTill'])
+
+        # Table lines and CSV rows are flushed together in batches; each batch's
+        # end dates are counted with Counter.update() over a C-level map
+        rows = []
+        for result in _ordered_parallel_map(fetch, _read_serials(input_f), concurrency):
+            serial, warranty_till = result['SerialNumber'], result['WarrantyTill']
+            lines.append(f"{serial:<15} {warranty_till:<15}")
+            rows.append((serial, warranty_till))
+            if len(rows) >= OUTPUT_BATCH_SIZE:
+                end_date_counts.update(map(itemgetter(1), rows))
+                _flush_batch(lines, rows, writer)
+                lines = []
+                rows = []
+        end_date_counts.update(map(itemgetter(1), rows))
+        _flush_batch(lines, rows, writer)
+
+    # Count active vs expired (global)
+    year_counts = _tally_by_year(end_date_counts)
+    active_count = sum(d['Active'] for d in year_counts.values())
+    expired_count = sum(d['Expired'] for d in year_counts.values())
 
     # Display summary (overall)
     print("\n" + "=" * 32)
     print(f"Warranty active: {active_count}")
     print(f"Warranty ended: {expired_count}")
 
-    # Save main results if requested
     if output_file:
-        with open(output_file, 'w', newline='') as f:
-            fieldnames = ['SerialNumber', 'WarrantyTill']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(all_results)
         print(f"Saved detailed results CSV → {output_file}")
 
     # Yearly summary if requested
     if do_summary_by_year:
-        summarize_by_year(all_results, summary_output)
+        _report_year_summary(year_counts, summary_output)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -214,6 +503,17 @@ def main():
         '--summary-output',
         help='Optional CSV path to export the yearly summary table'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f'Number of parallel lookups in bulk mode (default: {DEFAULT_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=f'Always query Lenovo instead of using cached pages in {CACHE_DIR}'
+    )
     parser.add_argument(
         '-h', '--help',
         action='store_true',
@@ -232,7 +532,7 @@ def main():
         print("\nGet Lenovo warranty information via web scrape using serial number")
         print("\nUsage:")
         print("  Single: python get_lenovo_warranty.py <serial_number>")
-        print("  Bulk:   python get_lenovo_warranty.py -f devices.txt [-o output.csv]")
+        print("  Bulk:   python get_lenovo_warranty.py -f devices.txt [-o output.csv] [--concurrency N]")
         print("  Bulk + summary by year:")
         print("          python get_lenovo_warranty.py -f devices.txt --summary-by-year")
         print("          [--summary-output summary.csv]")
@@ -242,6 +542,8 @@ def main():
         print("  -o, --output OUTPUT   Output CSV file (only used with -f option)")
         print("  --summary-by-year     Print a summary table grouped by EndDate year")
         print("  --summary-output FILE Optional CSV path to export the yearly summary")
+        print(f"  --concurrency N       Parallel lookups in bulk mode (default: {DEFAULT_CONCURRENCY})")
+        print("  --no-cache            Always query Lenovo instead of using the page cache")
         print("  -h, --help            Show this help message and exit")
         sys.exit(0)
 
@@ -249,19 +551,25 @@ def main():
     print("\nIn progress, please wait...\n")
 
     if args.file:
+        # Keep one pooled connection per worker so large --concurrency values still reuse TLS
+        if args.concurrency > DEFAULT_POOL_SIZE:
+            _mount_adapter(args.concurrency)
+
         # Bulk lookup (supports summary)
         process_bulk_lookup(
             args.file,
             args.output,
             do_summary_by_year=args.summary_by_year,
-            summary_output=args.summary_output
+            summary_output=args.summary_output,
+            concurrency=args.concurrency,
+            use_cache=not args.no_cache
         )
     elif args.serial:
         # Single lookup
         fieldnames = ['SerialNumber', 'WarrantyTill']
         writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
         writer.writeheader()
-        warranty_info = get_lenovo_warranty(args.serial)
+        warranty_info = get_lenovo_warranty(args.serial, use_cache=not args.no_cache)
         writer.writerow(warranty_info)
 
 if __name__ == '__main__':